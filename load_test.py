@@ -0,0 +1,504 @@
+"""Нагрузочное тестирование Flask-приложения.
+
+Поднимает Flask_app под gunicorn с локальной заменой источника прогноза
+(Яндекс.Диск), гоняет смесь запросов операторов ('/' и '/move_point')
+с заданной параллельностью и печатает пропускную способность, перцентили
+задержек, размеры ответов и рост памяти воркеров.
+
+Пример:
+    python load_test.py --workers 2 --concurrency 8 --duration 60
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+FORECAST_CSV_ENV = 'MKO_FORECAST_CSV'
+FORECAST_DELAY_ENV = 'MKO_FORECAST_DELAY'
+
+CRITERIA_DEFAULTS = {
+    'Давление на выходе (атм) ↑': 10,
+    'Износ оборудования (%) ↓ [0-100]': 30,
+    'Затраты на ТО (руб/ч) ↓': 500,
+    'Возраст оборудования (лет) ↓': 5,
+    'Общая эффективность ↑': 70,
+    'Требуемая производительность (т/ч) ↑': 50
+}
+
+PUMP_SETS = [
+    ('Насос 1',),
+    ('Насос 2',),
+    ('Насос 1', 'Насос 2')
+]
+
+# Пауза оператора после неудачной отправки формы, чтобы недоступный сервер
+# не превращал потоки в холостой цикл
+ERROR_BACKOFF = 0.5
+
+MAIN_PLOT_RE = re.compile(r"const mainPlotData = JSON\.parse\('(.*?)'\);", re.S)
+
+
+class LocalForecastDisk:
+    """Замена yadisk.YaDisk: отдает прогноз из локального CSV-файла."""
+
+    def __init__(self, token=None, **kwargs):
+        self.path = os.environ[FORECAST_CSV_ENV]
+        self.delay = float(os.environ.get(FORECAST_DELAY_ENV, 0))
+
+    def check_token(self) -> bool:
+        return True
+
+    def download(self, remote_path: str, buffer: io.BytesIO):
+        # Имитация сетевой задержки Яндекс.Диска
+        if self.delay:
+            time.sleep(self.delay)
+        with open(self.path, 'rb') as f:
+            buffer.write(f.read())
+
+
+def create_app():
+    """Фабрика WSGI-приложения для gunicorn ('load_test:create_app()')."""
+    import yadisk
+    yadisk.YaDisk = LocalForecastDisk
+    from Flask_app import app
+    return app
+
+
+def write_forecast_csv(path: str, periods: int = 48):
+    # Формат как у forecast.csv на Яндекс.Диске: значения до деления на 1_000_004
+    dates = pd.date_range(end=pd.Timestamp.now(), periods=periods, freq='10min')
+    vals = np.random.normal(107.5, 0.5, periods) * 1_000_004
+    pd.DataFrame({'timestamp': dates, 'val': vals}).to_csv(path, index=False)
+
+
+def get_free_port() -> int:
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+    finally:
+        s.close()
+
+
+def get_child_pids(pid: int) -> list:
+    """PID дочерних процессов (воркеров gunicorn) через /proc."""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/status') as f:
+                for line in f:
+                    if line.startswith('PPid:'):
+                        if int(line.split()[1]) == pid:
+                            pids.append(int(entry))
+                        break
+        except OSError:
+            pass
+    return pids
+
+
+def get_rss_kb(pid: int):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler(threading.Thread):
+    """Периодически снимает RSS воркеров gunicorn."""
+
+    def __init__(self, master_pid: int, interval: float = 1.0):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.start_rss = {}
+        self.last_rss = {}
+        self.peak_rss = {}
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        if not os.path.isdir(f'/proc/{self.master_pid}'):
+            return
+        for pid in get_child_pids(self.master_pid):
+            rss = get_rss_kb(pid)
+            if rss is None:
+                continue
+            self.start_rss.setdefault(pid, rss)
+            self.last_rss[pid] = rss
+            self.peak_rss[pid] = max(self.peak_rss.get(pid, 0), rss)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.sample()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+
+class Stats:
+    """Результаты запросов: (задержка, размер ответа, статус).
+
+    Статус - HTTP-код ответа либо строка с типом сбоя: 'timeout', 'refused',
+    'conn_error', 'bad_response' (оборванный или неразбираемый ответ).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = {}
+        self.operator_errors = {}
+
+    def add(self, endpoint: str, latency: float, size: int, status):
+        with self.lock:
+            self.records.setdefault(endpoint, []).append((latency, size, status))
+
+    def add_operator_error(self, exc: Exception):
+        name = type(exc).__name__
+        with self.lock:
+            self.operator_errors[name] = self.operator_errors.get(name, 0) + 1
+
+
+def percentile(sorted_vals: list, q: float) -> float:
+    if not sorted_vals:
+        return float('nan')
+    idx = min(len(sorted_vals) - 1, max(0, int(np.ceil(q / 100 * len(sorted_vals))) - 1))
+    return sorted_vals[idx]
+
+
+def classify_error(exc: Exception) -> str:
+    reason = exc.reason if isinstance(exc, urllib.error.URLError) else exc
+    if isinstance(reason, (socket.timeout, TimeoutError)):
+        return 'timeout'
+    if isinstance(reason, ConnectionRefusedError):
+        return 'refused'
+    return 'conn_error'
+
+
+def timed_request(stats: Stats, endpoint: str, req: urllib.request.Request, timeout: float, parse=None):
+    """Выполняет запрос и записывает результат.
+
+    parse - функция разбора тела успешного ответа; если она падает, ответ
+    считается ошибкой 'bad_response'. Возвращает результат parse (или тело)
+    либо None при ошибке.
+    """
+    start = time.perf_counter()
+    body, status, result = b'', None, None
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+        try:
+            body = e.read()
+        except (http.client.HTTPException, OSError):
+            pass
+    except (urllib.error.URLError, OSError) as e:
+        status = classify_error(e)
+    except http.client.HTTPException:
+        status = 'bad_response'
+    latency = time.perf_counter() - start
+
+    if status == 200:
+        try:
+            result = parse(body) if parse else body
+        except (ValueError, KeyError, IndexError, TypeError):
+            status = 'bad_response'
+    stats.add(endpoint, latency, len(body), status)
+    return result if status == 200 else None
+
+
+def plot_points(main_plot: dict) -> list:
+    """Точки трассы 'Все решения' графика Парето (по ним кликает оператор)."""
+    for trace in main_plot['data']:
+        if trace.get('name') == 'Все решения':
+            return list(zip(trace['x'], trace['y']))
+    return []
+
+
+def parse_index_page(body: bytes) -> list:
+    # main_plot встраивается в страницу как JSON.parse('{{ main_plot | tojson | safe }}')
+    match = MAIN_PLOT_RE.search(body.decode('utf-8'))
+    if match is None:
+        raise ValueError('main_plot не найден на странице')
+    return plot_points(json.loads(match.group(1)))
+
+
+def parse_move_point(body: bytes) -> list:
+    return plot_points(json.loads(body)['main_plot'])
+
+
+def build_form(rng: random.Random, num_solutions: int, pumps: tuple) -> dict:
+    form = {name: round(val * rng.uniform(0.8, 1.2), 2) for name, val in CRITERIA_DEFAULTS.items()}
+    form['Износ оборудования (%) ↓ [0-100]'] = min(100, form['Износ оборудования (%) ↓ [0-100]'])
+    form['num_solutions'] = num_solutions
+    for pump_name in pumps:
+        form[f'{pump_name}_enabled'] = 'on'
+    return form
+
+
+def operator_iteration(base_url: str, args, stats: Stats, stop: threading.Event, deadline: float,
+                       rng: random.Random) -> bool:
+    """Отправка формы и несколько кликов по точкам графика, как в браузере.
+
+    Возвращает False, если форму отправить не удалось.
+    """
+    form = build_form(rng, rng.choice(args.num_solutions), rng.choice(PUMP_SETS))
+    req = urllib.request.Request(
+        base_url + '/',
+        data=urllib.parse.urlencode(form).encode(),
+        method='POST'
+    )
+    # Первый клик - по точке из графика, встроенного в страницу после отправки формы
+    points = timed_request(stats, '/', req, args.timeout, parse=parse_index_page)
+    if points is None:
+        return False
+
+    for _ in range(rng.randint(0, args.max_clicks)):
+        if not points or stop.is_set() or time.time() >= deadline:
+            break
+        x, y = rng.choice(points)
+        req = urllib.request.Request(
+            base_url + '/move_point',
+            data=json.dumps({'x': x, 'y': y}).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        # Следующие клики - по точкам из графика, возвращенного /move_point
+        points = timed_request(stats, '/move_point', req, args.timeout, parse=parse_move_point) or points
+        if args.think_time:
+            stop.wait(rng.uniform(0, args.think_time))
+    return True
+
+
+def operator_session(base_url: str, args, stats: Stats, stop: threading.Event, deadline: float,
+                     rng_seed: int):
+    """Один оператор: повторяет сценарий до окончания теста или сигнала остановки."""
+    rng = random.Random(rng_seed)
+    while not stop.is_set() and time.time() < deadline:
+        try:
+            if not operator_iteration(base_url, args, stats, stop, deadline, rng):
+                stop.wait(ERROR_BACKOFF)
+        except Exception as e:
+            # Поток не должен завершаться раньше срока, иначе падает заявленная параллельность
+            stats.add_operator_error(e)
+            stop.wait(ERROR_BACKOFF)
+
+
+def wait_until_ready(base_url: str, proc: subprocess.Popen, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'gunicorn завершился с кодом {proc.returncode}')
+        try:
+            with urllib.request.urlopen(base_url + '/', timeout=5) as resp:
+                if resp.status == 200:
+                    return
+        except (urllib.error.URLError, OSError, http.client.HTTPException):
+            time.sleep(0.5)
+    raise RuntimeError('Сервер не запустился за отведенное время')
+
+
+def start_server(args, forecast_path: str, port: int) -> subprocess.Popen:
+    env = os.environ.copy()
+    env[FORECAST_CSV_ENV] = forecast_path
+    env[FORECAST_DELAY_ENV] = str(args.forecast_delay)
+    gunicorn = shutil.which('gunicorn')
+    cmd = [gunicorn] if gunicorn else [sys.executable, '-m', 'gunicorn']
+    cmd += [
+        '--chdir', os.path.dirname(os.path.abspath(__file__)),
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(args.workers),
+        '--timeout', str(args.worker_timeout),
+        '--log-level', 'warning',
+        'load_test:create_app()'
+    ]
+    return subprocess.Popen(cmd, env=env)
+
+
+def print_report(stats: Stats, elapsed: float, sampler: MemorySampler = None):
+    """Задержки, RPS и размеры считаются только по успешным ответам (200);
+    ошибки выводятся отдельно с разбивкой по статусу."""
+    print(f"\nДлительность: {elapsed:.1f} с")
+    header = f"{'Эндпоинт':<12}{'Успешно':>10}{'Ошибок':>8}{'RPS':>8}" \
+             f"{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'Ср. ответ, КБ':>15}"
+    print(header)
+    print('-' * len(header))
+    total_ok, total_err = 0, 0
+    errors_by_endpoint = {}
+    for endpoint, recs in sorted(stats.records.items()):
+        ok = [r for r in recs if r[2] == 200]
+        errors = {}
+        for r in recs:
+            if r[2] != 200:
+                errors[str(r[2])] = errors.get(str(r[2]), 0) + 1
+        errors_by_endpoint[endpoint] = errors
+        lat = sorted(r[0] * 1000 for r in ok)
+        size = np.mean([r[1] for r in ok]) / 1024 if ok else float('nan')
+        total_ok += len(ok)
+        total_err += len(recs) - len(ok)
+        print(f"{endpoint:<12}{len(ok):>10}{len(recs) - len(ok):>8}{len(ok) / elapsed:>8.2f}"
+              f"{percentile(lat, 50):>10.1f}{percentile(lat, 95):>10.1f}{percentile(lat, 99):>10.1f}"
+              f"{size:>15.1f}")
+    print(f"Всего: {total_ok} успешных запросов ({total_ok / elapsed:.2f} запр/с), ошибок: {total_err}")
+
+    if total_err:
+        print("\nОшибки по статусу:")
+        for endpoint, errors in errors_by_endpoint.items():
+            for status, count in sorted(errors.items()):
+                print(f"  {endpoint:<12}{status:<14}{count:>8}")
+    if stats.operator_errors:
+        print("\nИсключения в потоках операторов:")
+        for name, count in sorted(stats.operator_errors.items()):
+            print(f"  {name:<26}{count:>8}")
+
+    if sampler is None:
+        return
+    if not sampler.last_rss:
+        print("\nПамять воркеров: нет данных (/proc недоступен)")
+        return
+    print("\nПамять воркеров (RSS, МБ):")
+    for pid in sorted(sampler.last_rss):
+        start, last, peak = sampler.start_rss[pid], sampler.last_rss[pid], sampler.peak_rss[pid]
+        print(f"  PID {pid}: старт {start / 1024:.1f}, конец {last / 1024:.1f}, "
+              f"пик {peak / 1024:.1f}, рост {(last - start) / 1024:+.1f}")
+
+
+def run_load(base_url: str, args, stats: Stats, proc: subprocess.Popen = None) -> float:
+    """Запускает операторов и ждет окончания теста.
+
+    Тест прерывается досрочно по Ctrl-C или если мастер gunicorn завершился;
+    в обоих случаях возвращается время до остановки для частичного отчета.
+    """
+    stop = threading.Event()
+    deadline = time.time() + args.duration
+    threads = [
+        threading.Thread(target=operator_session,
+                         args=(base_url, args, stats, stop, deadline, args.seed + i))
+        for i in range(args.concurrency)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    try:
+        while any(t.is_alive() for t in threads):
+            if proc is not None and proc.poll() is not None:
+                print(f"\ngunicorn завершился с кодом {proc.returncode}, тест остановлен")
+                break
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        print("\nТест прерван, ожидание завершения текущих запросов...")
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for t in threads:
+        t.join()
+    return elapsed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест Flask_app')
+    parser.add_argument('--url', help='Адрес уже запущенного сервера (без запуска gunicorn)')
+    parser.add_argument('--workers', type=int, default=2, help='Число воркеров gunicorn')
+    parser.add_argument('--concurrency', type=int, default=4, help='Число одновременных операторов')
+    parser.add_argument('--duration', type=float, default=30, help='Длительность теста, с')
+    parser.add_argument('--num-solutions', default='100,500,1000',
+                        help='Значения num_solutions через запятую')
+    parser.add_argument('--max-clicks', type=int, default=5,
+                        help='Максимум кликов /move_point после отправки формы')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='Максимальная пауза оператора между кликами, с')
+    parser.add_argument('--forecast-delay', type=float, default=0.0,
+                        help='Задержка загрузки прогноза из локального источника, с; '
+                             'прогноз загружается один раз при старте воркера, поэтому '
+                             'влияет только на время запуска, а не на задержки запросов')
+    parser.add_argument('--timeout', type=float, default=60, help='Таймаут запроса клиента, с')
+    parser.add_argument('--worker-timeout', type=int, default=None,
+                        help='Таймаут воркера gunicorn, с (по умолчанию вдвое больше --timeout)')
+    parser.add_argument('--startup-timeout', type=float, default=60,
+                        help='Время ожидания запуска сервера, с')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error('--concurrency должен быть не меньше 1')
+    if args.duration <= 0:
+        parser.error('--duration должен быть больше 0')
+    if args.max_clicks < 0:
+        parser.error('--max-clicks не может быть отрицательным')
+    if args.workers < 1:
+        parser.error('--workers должен быть не меньше 1')
+    if args.think_time < 0 or args.forecast_delay < 0:
+        parser.error('--think-time и --forecast-delay не могут быть отрицательными')
+    try:
+        args.num_solutions = [int(n) for n in args.num_solutions.split(',')]
+    except ValueError:
+        parser.error(f'--num-solutions: ожидаются целые числа через запятую, получено {args.num_solutions!r}')
+    if any(n < 1 for n in args.num_solutions):
+        parser.error('--num-solutions: значения должны быть не меньше 1')
+    if args.timeout < 1:
+        parser.error('--timeout должен быть не меньше 1 с')
+    if args.worker_timeout is None:
+        args.worker_timeout = int(args.timeout * 2)
+    if args.worker_timeout <= args.timeout:
+        # Иначе медленный запрос гонится с убийством воркера, и таймауты неразличимы
+        parser.error('--worker-timeout должен быть больше --timeout')
+    return args
+
+
+def main():
+    args = parse_args()
+    stats = Stats()
+
+    if args.url:
+        elapsed = run_load(args.url.rstrip('/'), args, stats)
+        print_report(stats, elapsed)
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix='mko_load_')
+    forecast_path = os.path.join(tmp_dir, 'forecast.csv')
+    write_forecast_csv(forecast_path)
+    port = get_free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    proc = start_server(args, forecast_path, port)
+    try:
+        wait_until_ready(base_url, proc, args.startup_timeout)
+        print(f"Сервер запущен на {base_url}, воркеров: {args.workers}, операторов: {args.concurrency}")
+        sampler = MemorySampler(proc.pid)
+        sampler.start()
+        elapsed = run_load(base_url, args, stats, proc)
+        sampler.stop()
+        print_report(stats, elapsed, sampler)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()